@@ -1,50 +1,132 @@
 import streamlit as st
-import json
+import bisect
+import hashlib
 import os
 import io
-import requests
+
+try:
+    # RE2 : matching en O(n) garanti, sans backtracking. Optionnel.
+    import re2 as re
+except ImportError:
+    import re
+from collections import defaultdict
+from functools import lru_cache
+from itertools import chain
+
+from codec import loads as json_loads, dumps as json_dumps
 from datetime import datetime
-from dotenv import load_dotenv
-from docx import Document
-from docx.shared import Pt, Inches, RGBColor
-from docx.enum.text import WD_ALIGN_PARAGRAPH
+from xml.sax.saxutils import escape as _xml_escape
+
+# requests, python-docx et dotenv sont importés au point d'usage : ils ne
+# servent qu'aux exports et au premier chargement, pas au rendu courant.
 
 # --- Configuration ---
 st.set_page_config(page_title="🛒 Liste de courses", page_icon="🛒", layout="wide")
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-load_dotenv(os.path.join(BASE_DIR, ".env"))
 
 RECETTES_PATH = os.path.join(BASE_DIR, "recettes.json")
 CATALOGUE_PATH = os.path.join(BASE_DIR, "catalogue.json")
-NOTION_TOKEN = os.getenv("NOTION_TOKEN")
-NOTION_PAGE_ID = os.getenv("NOTION_PAGE_ID")
+
+
+@st.cache_resource(show_spinner=False)
+def _init_env():
+    """Charge le .env une seule fois par processus, pas à chaque rerun."""
+    from dotenv import load_dotenv
+
+    load_dotenv(os.path.join(BASE_DIR, ".env"))
+    return os.getenv("NOTION_TOKEN"), os.getenv("NOTION_PAGE_ID")
+
+
+NOTION_TOKEN, NOTION_PAGE_ID = _init_env()
 
 UNITES = ["pièce", "g", "kg", "ml", "cl", "L"]
 
+# Ordre de parcours des rayons en magasin (liste finale).
+_RAYON_ORDER = (
+    "BOULANGERIE", "LÉGUMES", "FRUITS", "AIL & FINES HERBES",
+    "CHARCUTERIE", "TRAITEUR", "POISSONNERIE", "BOUCHERIE",
+    "SURGELÉS", "FROMAGES", "YAOURTS", "PRODUITS LAITIERS",
+    "ÉPICERIE SALÉE", "CUISINE DU MONDE", "ÉPICERIE SUCRÉE",
+    "BOISSONS", "HYGIÈNE & DIVERS",
+)
+_RAYON_PRIORITY = {rayon: i for i, rayon in enumerate(_RAYON_ORDER)}
+
 
 # --- Chargement / sauvegarde ---
+@st.cache_data(show_spinner=False)
+def _load_json(path, mtime, size):
+    """Lit et parse un fichier JSON. mtime/size font partie de la clé de cache :
+    toute modification du fichier invalide automatiquement l'entrée."""
+    with open(path, "rb") as f:
+        return json_loads(f.read())
+
+
+@st.cache_data(show_spinner=False)
+def _load_recettes(path, mtime, size):
+    plats = _load_json(path, mtime, size)["plats"]
+    # Info-bulle précalculée une fois par (re)chargement du fichier,
+    # plutôt que re-jointe pour chaque recette à chaque rerun.
+    for r in plats:
+        r["_tooltip"] = ", ".join(
+            format_item(ing["nom"], ing.get("quantite", 1), ing.get("unite", "pièce"))
+            for ing in r["ingredients"]
+        )
+    return plats
+
+
 def load_recettes():
-    with open(RECETTES_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)["plats"]
+    stat = os.stat(RECETTES_PATH)
+    return _load_recettes(RECETTES_PATH, stat.st_mtime, stat.st_size)
 
 
 def load_catalogue():
-    with open(CATALOGUE_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)["rayons"]
+    stat = os.stat(CATALOGUE_PATH)
+    return _load_json(CATALOGUE_PATH, stat.st_mtime, stat.st_size)["rayons"]
+
+
+def _dump_json(path, obj):
+    with open(path, "wb") as f:
+        f.write(json_dumps(obj, indent=True))
 
 
 def save_recettes(plats):
-    with open(RECETTES_PATH, "w", encoding="utf-8") as f:
-        json.dump({"plats": plats}, f, ensure_ascii=False, indent=2)
+    # Ne pas persister les champs dérivés (préfixés par _).
+    clean = [{k: v for k, v in r.items() if not k.startswith("_")} for r in plats]
+    _dump_json(RECETTES_PATH, {"plats": clean})
+    _load_json.clear()
+    _load_recettes.clear()
+    _compute_recipe_by_rayon.clear()
 
 
 def save_catalogue(rayons):
-    with open(CATALOGUE_PATH, "w", encoding="utf-8") as f:
-        json.dump({"rayons": rayons}, f, ensure_ascii=False, indent=2)
+    _dump_json(CATALOGUE_PATH, {"rayons": rayons})
+    _load_json.clear()
 
 
 # --- Utilitaires ---
+# Compilé une seule fois au chargement du module : évite le passage par le
+# cache interne de `re` à chaque ingrédient.
+_QTY_RE = re.compile(r"^(.+?)\s*\((\d+)\s*(g|kg|ml|cl|L)?\)$")
+
+
+@lru_cache(maxsize=4096)
+def parse_quantity(nom):
+    """Extrait une quantité embarquée dans un nom d'article.
+    'Carottes (450g)' -> ('Carottes', 450, 'g') ; 'Œufs (6)' -> ('Œufs', 6, 'pièce').
+    Retourne (nom, None, "") si aucune quantité n'est détectée.
+    """
+    # Cas majoritaire : pas de parenthèse, donc pas de quantité → inutile
+    # d'invoquer le moteur d'expressions régulières.
+    if "(" not in nom:
+        return nom.strip(), None, ""
+    m = _QTY_RE.match(nom)
+    if not m:
+        return nom.strip(), None, ""
+    base, qty, unite = m.group(1), int(m.group(2)), m.group(3)
+    return base.strip(), qty, unite or "pièce"
+
+
 def format_item(nom, quantite, unite):
     """Formate un article pour l'affichage : 'Carottes — 450g' ou 'Poulet — x1'."""
     if unite == "pièce":
@@ -59,94 +141,73 @@ def merge_ingredients(ingredients_list):
     Entrée: liste de {"nom", "rayon", "quantite", "unite"}
     Retourne: {rayon: [(nom, quantite, unite), ...]}
     """
-    merged = {}
+    per_rayon = defaultdict(dict)
     for ing in ingredients_list:
         nom = ing["nom"]
-        rayon = ing["rayon"]
         qty = ing.get("quantite", 1)
         unite = ing.get("unite", "pièce")
-        key = (nom.lower(), rayon)
-
-        if key in merged:
-            if merged[key]["unite"] == unite:
-                merged[key]["quantite"] += qty
-            else:
-                # Unités différentes → garder séparés (ajouter comme nouvel item)
-                alt_key = (nom.lower() + f"_{unite}", rayon)
-                if alt_key in merged:
-                    merged[alt_key]["quantite"] += qty
-                else:
-                    merged[alt_key] = {
-                        "rayon": rayon,
-                        "nom": nom,
-                        "quantite": qty,
-                        "unite": unite,
-                    }
+        # Anciens articles du catalogue type 'Carottes (450g)' : la quantité
+        # est dans le nom, pas dans les champs structurés.
+        if qty == 1 and unite == "pièce":
+            base, parsed_qty, parsed_unite = parse_quantity(nom)
+            if parsed_qty is not None:
+                nom, qty, unite = base, parsed_qty, parsed_unite
+
+        # Même nom + même unité → cumul ; unités différentes → entrées séparées.
+        bucket = per_rayon[ing["rayon"]]
+        key = (nom.lower(), unite)
+        entry = bucket.get(key)
+        if entry is None:
+            bucket[key] = [nom, qty, unite]
         else:
-            merged[key] = {
-                "rayon": rayon,
-                "nom": nom,
-                "quantite": qty,
-                "unite": unite,
-            }
-
-    result = {}
-    for data in merged.values():
-        rayon = data["rayon"]
-        if rayon not in result:
-            result[rayon] = []
-        result[rayon].append((data["nom"], data["quantite"], data["unite"]))
+            entry[1] += qty
 
     # Trier par nom au sein de chaque rayon
-    for rayon in result:
-        result[rayon].sort(key=lambda x: x[0].lower())
-
-    return result
+    return {
+        rayon: sorted((tuple(e) for e in bucket.values()), key=lambda x: x[0].lower())
+        for rayon, bucket in per_rayon.items()
+    }
 
 
-def get_recipe_ingredients(recettes, selected_names):
+def get_recipe_ingredients(recettes_by_name, selected_names):
     """Récupère tous les ingrédients des recettes sélectionnées."""
     ingredients = []
-    for recette in recettes:
-        if recette["nom"] in selected_names:
+    for nom in selected_names:
+        recette = recettes_by_name.get(nom)
+        if recette:
             ingredients.extend(recette["ingredients"])
     return ingredients
 
 
+@st.cache_data(show_spinner=False, ttl=24 * 60 * 60)
+def _compute_recipe_by_rayon(selected_tuple, recettes_mtime):
+    """Ingrédients des recettes sélectionnées, fusionnés par rayon.
+    Mis en cache sur la sélection (triée) : un rerun qui ne change pas
+    la sélection réutilise directement le résultat. Le mtime du fichier
+    recettes fait partie de la clé pour suivre les éditions externes."""
+    ingredients = get_recipe_ingredients(recettes_by_name, selected_tuple)
+    return merge_ingredients(ingredients)
+
+
 def build_final_list(recipe_items_by_rayon, free_items_by_rayon):
     """Combine recettes + produits libres, par rayon.
     Les deux entrées sont {rayon: [(nom, quantite, unite), ...]}
     Retourne le même format, fusionné et trié par rayon.
     """
     # Rassembler tous les items dans une seule liste pour fusion
-    all_items = []
-    for rayon, items in recipe_items_by_rayon.items():
-        for nom, qty, unite in items:
-            all_items.append({"nom": nom, "rayon": rayon, "quantite": qty, "unite": unite})
-    for rayon, items in free_items_by_rayon.items():
-        for nom, qty, unite in items:
-            all_items.append({"nom": nom, "rayon": rayon, "quantite": qty, "unite": unite})
-
-    merged = merge_ingredients(all_items)
-
-    # Ordonner par rayon
-    rayon_order = [
-        "BOULANGERIE", "LÉGUMES", "FRUITS", "AIL & FINES HERBES",
-        "CHARCUTERIE", "TRAITEUR", "POISSONNERIE", "BOUCHERIE",
-        "SURGELÉS", "FROMAGES", "YAOURTS", "PRODUITS LAITIERS",
-        "ÉPICERIE SALÉE", "CUISINE DU MONDE", "ÉPICERIE SUCRÉE",
-        "BOISSONS", "HYGIÈNE & DIVERS",
+    all_items = [
+        {"nom": nom, "rayon": rayon, "quantite": qty, "unite": unite}
+        for rayon, items in chain(recipe_items_by_rayon.items(), free_items_by_rayon.items())
+        for nom, qty, unite in items
     ]
 
-    final = {}
-    for rayon in rayon_order:
-        if rayon in merged:
-            final[rayon] = merged[rayon]
-
-    for rayon in sorted(set(merged.keys()) - set(rayon_order)):
-        final[rayon] = merged[rayon]
+    merged = merge_ingredients(all_items)
 
-    return final
+    # Ordonner par rayon : l'ordre magasin d'abord, puis les rayons
+    # inconnus en alphabétique — un seul tri sur les rayons présents.
+    unknown = len(_RAYON_PRIORITY)
+    order = sorted(merged, key=lambda r: (_RAYON_PRIORITY.get(r, unknown), r))
+    return {rayon: merged[rayon] for rayon in order}
 
 
 def subtract_stock(final_list, stock_items):
@@ -158,6 +219,12 @@ def subtract_stock(final_list, stock_items):
     stock_index = {}
     for rayon, items in stock_items.items():
         for nom, qty, unite in items:
+            # Même normalisation que merge_ingredients : un article de stock
+            # 'Carottes (450g)' doit matcher l'entrée 'Carottes' de la liste.
+            if qty == 1 and unite == "pièce":
+                base, parsed_qty, parsed_unite = parse_quantity(nom)
+                if parsed_qty is not None:
+                    nom, qty, unite = base, parsed_qty, parsed_unite
             key = (nom.lower(), rayon)
             if key in stock_index:
                 if stock_index[key]["unite"] == unite:
@@ -190,25 +257,58 @@ def subtract_stock(final_list, stock_items):
     return result
 
 
-def add_ingredient_to_catalogue(catalogue, nom_ingredient, rayon_nom):
-    """Ajoute un ingrédient au catalogue s'il n'y est pas déjà."""
-    for rayon in catalogue:
-        if rayon["nom"] == rayon_nom:
-            existing_lower = [a.lower() for a in rayon["articles"]]
-            if nom_ingredient.lower() not in existing_lower:
-                rayon["articles"].append(nom_ingredient)
-                rayon["articles"].sort(key=str.lower)
-                return True
-            return False
-    catalogue.append({"nom": rayon_nom, "articles": [nom_ingredient]})
+def build_catalogue_index(catalogue):
+    """Index {nom_rayon: (rayon, noms en minuscules)} pour les ajouts en O(1)."""
+    return {r["nom"]: (r, {a.lower() for a in r["articles"]}) for r in catalogue}
+
+
+def add_ingredient_to_catalogue(catalogue, index, nom_ingredient, rayon_nom):
+    """Ajoute un ingrédient au catalogue s'il n'y est pas déjà.
+    L'index (voir build_catalogue_index) est tenu à jour en parallèle."""
+    entry = index.get(rayon_nom)
+    if entry is None:
+        rayon = {"nom": rayon_nom, "articles": [nom_ingredient]}
+        catalogue.append(rayon)
+        index[rayon_nom] = (rayon, {nom_ingredient.lower()})
+        return True
+    rayon, existing_lower = entry
+    low = nom_ingredient.lower()
+    if low in existing_lower:
+        return False
+    existing_lower.add(low)
+    # Insertion triée : garde l'invariant alphabétique sans re-trier la liste.
+    bisect.insort(rayon["articles"], nom_ingredient, key=str.lower)
     return True
 
 
+@st.cache_resource(show_spinner=False)
+def _notion_session():
+    """Session partagée : réutilise la connexion TLS entre les appels Notion
+    au lieu d'ouvrir une connexion par requête."""
+    import requests
+
+    return requests.Session()
+
+# Parties constantes des blocs Notion, copiées par | plutôt que reconstruites.
+_TODO_TPL = {"object": "block", "type": "to_do"}
+_HEADING_TPL = {"object": "block", "type": "heading_2"}
+
+
 def export_to_notion(final_list, selected_recipes):
     """Crée une page Notion avec des cases à cocher via l'API."""
+    import requests
+
     if not NOTION_TOKEN or not NOTION_PAGE_ID:
         return False, "Configuration Notion manquante. Vérifiez le fichier .env.", None
 
+    # Ne rien renvoyer si la liste n'a pas changé depuis le dernier export.
+    payload_hash = hashlib.blake2b(
+        json_dumps([sorted(selected_recipes), final_list]),
+        digest_size=16,
+    ).hexdigest()
+    if st.session_state.get("notion_last_hash") == payload_hash:
+        return True, "Aucun changement depuis le dernier envoi.", st.session_state.get("notion_last_url")
+
     headers = {
         "Authorization": f"Bearer {NOTION_TOKEN}",
         "Content-Type": "application/json",
@@ -235,18 +335,14 @@ def export_to_notion(final_list, selected_recipes):
         children.append({"object": "block", "type": "divider", "divider": {}})
 
     for rayon, items in final_list.items():
-        children.append({
-            "object": "block",
-            "type": "heading_2",
+        children.append(_HEADING_TPL | {
             "heading_2": {
                 "rich_text": [{"type": "text", "text": {"content": rayon}}]
             }
         })
         for nom, qty, unite in items:
             display = format_item(nom, qty, unite)
-            children.append({
-                "object": "block",
-                "type": "to_do",
+            children.append(_TODO_TPL | {
                 "to_do": {
                     "rich_text": [{"type": "text", "text": {"content": display}}],
                     "checked": False,
@@ -261,11 +357,13 @@ def export_to_notion(final_list, selected_recipes):
         "children": children[:100],
     }
 
+    session = _notion_session()
+
     try:
-        resp = requests.post(
+        resp = session.post(
             "https://api.notion.com/v1/pages",
             headers=headers,
-            json=payload,
+            data=json_dumps(payload),
             timeout=15,
         )
 
@@ -274,15 +372,19 @@ def export_to_notion(final_list, selected_recipes):
 
             if len(children) > 100:
                 page_id = resp.json()["id"]
+                url = f"https://api.notion.com/v1/blocks/{page_id}/children"
+                # Envoi séquentiel : Notion ajoute les blocs dans l'ordre
+                # d'arrivée, des PATCH concurrents mélangeraient les rayons.
                 for i in range(100, len(children), 100):
-                    batch = children[i:i+100]
-                    requests.patch(
-                        f"https://api.notion.com/v1/blocks/{page_id}/children",
+                    session.patch(
+                        url,
                         headers=headers,
-                        json={"children": batch},
+                        data=json_dumps({"children": children[i:i + 100]}),
                         timeout=15,
                     )
 
+            st.session_state["notion_last_hash"] = payload_hash
+            st.session_state["notion_last_url"] = page_url
             return True, "Page créée dans Notion !", page_url
         else:
             error = resp.json().get("message", resp.text)
@@ -294,8 +396,26 @@ def export_to_notion(final_list, selected_recipes):
         return False, f"Erreur : {str(e)}", None
 
 
-def export_to_docx(final_list, selected_recipes):
-    """Génère un fichier Word de la liste de courses."""
+# Puce pré-assemblée en OOXML brut (sz = demi-points, 22 = 11 pt) : insérer
+# l'élément tout fait évite trois allers-retours python-docx/lxml par article.
+_BULLET_TPL = (
+    '<w:p xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+    '<w:pPr><w:pStyle w:val="ListBullet"/></w:pPr>'
+    '<w:r><w:rPr><w:sz w:val="22"/></w:rPr>'
+    '<w:t xml:space="preserve">{}</w:t></w:r></w:p>'
+)
+
+
+@st.cache_data(show_spinner=False, ttl=3600)
+def export_to_docx(final_tuple, recipes_tuple):
+    """Génère un fichier Word de la liste de courses, renvoyé en bytes.
+    Les entrées sont des tuples (hashables) pour que le document ne soit
+    reconstruit que lorsque la liste change réellement."""
+    from docx import Document
+    from docx.oxml import parse_xml
+    from docx.shared import Pt, RGBColor
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+
     doc = Document()
 
     style = doc.styles["Normal"]
@@ -313,19 +433,25 @@ def export_to_docx(final_list, selected_recipes):
     date_run.font.size = Pt(10)
     date_run.font.color.rgb = RGBColor(100, 100, 100)
 
-    if selected_recipes:
+    if recipes_tuple:
         doc.add_paragraph()
         plats_para = doc.add_paragraph()
         plats_run = plats_para.add_run("Plats : ")
         plats_run.bold = True
         plats_run.font.size = Pt(10)
-        plats_text = plats_para.add_run(" • ".join(selected_recipes))
+        plats_text = plats_para.add_run(" • ".join(recipes_tuple))
         plats_text.font.size = Pt(10)
         plats_text.font.color.rgb = RGBColor(80, 80, 80)
 
     doc.add_paragraph()
 
-    for rayon, items in final_list.items():
+    # Référencer le style garantit sa présence dans styles.xml.
+    doc.styles["List Bullet"]
+    body = doc.element.body
+    sect = body.xpath("./w:sectPr")
+    anchor = sect[0] if sect else None
+
+    for rayon, items in final_tuple:
         heading = doc.add_heading(rayon, level=2)
         for run in heading.runs:
             run.font.color.rgb = RGBColor(46, 117, 182)
@@ -333,19 +459,41 @@ def export_to_docx(final_list, selected_recipes):
 
         for nom, qty, unite in items:
             display = format_item(nom, qty, unite)
-            para = doc.add_paragraph(style="List Bullet")
-            run = para.add_run(display)
-            run.font.size = Pt(11)
+            bullet = parse_xml(_BULLET_TPL.format(_xml_escape(display)))
+            if anchor is not None:
+                anchor.addprevious(bullet)
+            else:
+                body.append(bullet)
 
     buffer = io.BytesIO()
     doc.save(buffer)
-    buffer.seek(0)
-    return buffer
+    return buffer.getvalue()
 
 
 # --- Chargement ---
 recettes = load_recettes()
+recettes_mtime = os.stat(RECETTES_PATH).st_mtime
 catalogue = load_catalogue()
+recettes_by_name = {r["nom"]: r for r in recettes}
+catalogue_index = build_catalogue_index(catalogue)
+
+# Clés de widgets précalculées : évite de reformater les mêmes f-strings
+# pour chaque article à chaque passage (sélection, stock, calcul final).
+recipe_keys = [(r["nom"], f"recette_{r['nom']}") for r in recettes]
+cat_keys = {
+    r["nom"]: [
+        (f"cat_{r['nom']}_{j}", f"qty_{r['nom']}_{j}", f"unit_{r['nom']}_{j}")
+        for j in range(len(r["articles"]))
+    ]
+    for r in catalogue
+}
+stock_keys = {
+    r["nom"]: [
+        (f"stock_{r['nom']}_{j}", f"stock_qty_{r['nom']}_{j}", f"stock_unit_{r['nom']}_{j}")
+        for j in range(len(r["articles"]))
+    ]
+    for r in catalogue
+}
 
 # --- Session state ---
 if "checked_items" not in st.session_state:
@@ -380,22 +528,17 @@ with tab_recettes:
         recettes_triees = [r for r in recettes_triees if q in r["nom"].lower()]
 
     for recette in recettes_triees:
-        ingredients_str = ", ".join(
-            format_item(ing["nom"], ing.get("quantite", 1), ing.get("unite", "pièce"))
-            for ing in recette["ingredients"]
-        )
         st.checkbox(
             recette["nom"],
             key=f"recette_{recette['nom']}",
-            help=ingredients_str,
+            help=recette["_tooltip"],
         )
 
-    _selected = [r["nom"] for r in recettes if st.session_state.get(f"recette_{r['nom']}", False)]
+    _selected = [nom for nom, key in recipe_keys if st.session_state.get(key)]
     if _selected:
         st.divider()
         st.subheader("Ingrédients sélectionnés")
-        _ingredients = get_recipe_ingredients(recettes, _selected)
-        _by_rayon = merge_ingredients(_ingredients)
+        _by_rayon = _compute_recipe_by_rayon(tuple(sorted(_selected)), recettes_mtime)
         for rayon, items in sorted(_by_rayon.items()):
             st.markdown(f"**{rayon}**")
             for nom, qty, unite in sorted(items, key=lambda x: x[0].lower()):
@@ -434,7 +577,7 @@ with tab_produits:
             add_product_btn = st.form_submit_button("➕ Ajouter")
 
             if add_product_btn and new_product_name.strip():
-                if add_ingredient_to_catalogue(catalogue, new_product_name.strip(), new_product_rayon):
+                if add_ingredient_to_catalogue(catalogue, catalogue_index, new_product_name.strip(), new_product_rayon):
                     save_catalogue(catalogue)
                     st.success(f"✅ « {new_product_name.strip()} » ajouté dans {new_product_rayon}")
                     st.rerun()
@@ -457,10 +600,9 @@ with tab_produits:
             matching = list(enumerate(rayon["articles"]))
 
         with st.expander(f"🏷️ {rayon['nom']} ({len(matching)} articles)", expanded=bool(q_produits)):
+            rayon_keys = cat_keys[rayon["nom"]]
             for j, article in matching:
-                cat_key = f"cat_{rayon['nom']}_{j}"
-                qty_key = f"qty_{rayon['nom']}_{j}"
-                unit_key = f"unit_{rayon['nom']}_{j}"
+                cat_key, qty_key, unit_key = rayon_keys[j]
                 del_key = f"del_{rayon['nom']}_{article}"
 
                 col_check, col_qty, col_unit, col_del = st.columns([5, 1, 1, 0.5])
@@ -511,10 +653,9 @@ with tab_stock:
             matching = list(enumerate(rayon["articles"]))
 
         with st.expander(f"🏷️ {rayon['nom']} ({len(matching)} articles)", expanded=bool(q_stock)):
+            rayon_keys = stock_keys[rayon["nom"]]
             for j, article in matching:
-                stock_key = f"stock_{rayon['nom']}_{j}"
-                stock_qty_key = f"stock_qty_{rayon['nom']}_{j}"
-                stock_unit_key = f"stock_unit_{rayon['nom']}_{j}"
+                stock_key, stock_qty_key, stock_unit_key = rayon_keys[j]
 
                 col_check, col_qty, col_unit = st.columns([3, 1, 1])
                 with col_check:
@@ -541,7 +682,12 @@ with tab_stock:
 # ==============================
 # ONGLET 4 : GÉRER LES RECETTES
 # ==============================
-with tab_gerer:
+# Fragment : l'éditeur ne touche la liste finale qu'à l'enregistrement
+# (qui fait un st.rerun complet), donc taper un nom ou ajouter un
+# ingrédient ne relance que ce bloc, pas toute l'app. Les autres onglets
+# alimentent la liste finale et doivent rester dans le rerun global.
+@st.fragment
+def render_gerer():
     st.header("Gérer les recettes")
 
     recettes_noms = sorted([r["nom"] for r in recettes], key=str.lower)
@@ -658,7 +804,7 @@ with tab_gerer:
 
                             catalogue_modified = False
                             for ing in st.session_state.new_recipe_ingredients:
-                                if add_ingredient_to_catalogue(catalogue, ing["nom"], ing["rayon"]):
+                                if add_ingredient_to_catalogue(catalogue, catalogue_index, ing["nom"], ing["rayon"]):
                                     catalogue_modified = True
                             if catalogue_modified:
                                 save_catalogue(catalogue)
@@ -706,7 +852,7 @@ with tab_gerer:
 
                         catalogue_modified = False
                         for ing in st.session_state.new_recipe_ingredients:
-                            if add_ingredient_to_catalogue(catalogue, ing["nom"], ing["rayon"]):
+                            if add_ingredient_to_catalogue(catalogue, catalogue_index, ing["nom"], ing["rayon"]):
                                 catalogue_modified = True
                         if catalogue_modified:
                             save_catalogue(catalogue)
@@ -718,29 +864,28 @@ with tab_gerer:
     else:
         st.caption("Ajoutez des ingrédients via le formulaire ci-dessus.")
 
+
+with tab_gerer:
+    render_gerer()
+
 # ============================================
 # CALCUL DE LA LISTE FINALE (hors des tabs)
 # ============================================
-selected_recipes_final = []
-for recette in recettes:
-    if st.session_state.get(f"recette_{recette['nom']}", False):
-        selected_recipes_final.append(recette["nom"])
+# Accès local : évite la résolution d'attribut st.session_state par article.
+ss = st.session_state
+
+selected_recipes_final = [nom for nom, key in recipe_keys if ss.get(key)]
 
-recipe_ingredients_final = get_recipe_ingredients(recettes, selected_recipes_final)
-recipe_by_rayon_final = merge_ingredients(recipe_ingredients_final)
+recipe_by_rayon_final = _compute_recipe_by_rayon(tuple(sorted(selected_recipes_final)), recettes_mtime)
 
 # Produits cochés avec quantités et unités
 free_items_final = {}
 for rayon in catalogue:
-    items = []
-    for j, article in enumerate(rayon["articles"]):
-        cat_key = f"cat_{rayon['nom']}_{j}"
-        qty_key = f"qty_{rayon['nom']}_{j}"
-        unit_key = f"unit_{rayon['nom']}_{j}"
-        if st.session_state.get(cat_key, False):
-            qty = st.session_state.get(qty_key, 1)
-            unite = st.session_state.get(unit_key, "pièce")
-            items.append((article, qty, unite))
+    items = [
+        (article, ss.get(qty_key, 1), ss.get(unit_key, "pièce"))
+        for article, (cat_key, qty_key, unit_key) in zip(rayon["articles"], cat_keys[rayon["nom"]])
+        if ss.get(cat_key)
+    ]
     if items:
         free_items_final[rayon["nom"]] = items
 
@@ -749,15 +894,13 @@ final_list_before_stock = build_final_list(recipe_by_rayon_final, free_items_fin
 # Stock : produits déjà en possession
 stock_items_final = {}
 for rayon in catalogue:
-    items = []
-    for j, article in enumerate(rayon["articles"]):
-        stock_key = f"stock_{rayon['nom']}_{j}"
-        stock_qty_key = f"stock_qty_{rayon['nom']}_{j}"
-        stock_unit_key = f"stock_unit_{rayon['nom']}_{j}"
-        if st.session_state.get(stock_key, False):
-            qty = st.session_state.get(stock_qty_key, 1)
-            unite = st.session_state.get(stock_unit_key, "pièce")
-            items.append((article, qty, unite))
+    items = [
+        (article, ss.get(stock_qty_key, 1), ss.get(stock_unit_key, "pièce"))
+        for article, (stock_key, stock_qty_key, stock_unit_key) in zip(
+            rayon["articles"], stock_keys[rayon["nom"]]
+        )
+        if ss.get(stock_key)
+    ]
     if items:
         stock_items_final[rayon["nom"]] = items
 
@@ -776,41 +919,51 @@ with tab_liste:
 
         st.divider()
 
-        total = sum(len(items) for items in final_list.values())
-        checked_count = sum(
-            1
+        check_keys = {
+            rayon: [f"check_{rayon}_{nom}" for nom, qty, unite in items]
             for rayon, items in final_list.items()
-            for nom, qty, unite in items
-            if f"check_{rayon}_{nom}" in st.session_state.checked_items
-        )
+        }
+        current_keys = {key for keys in check_keys.values() for key in keys}
+        checked_items = st.session_state.checked_items
+        # Purger les clés d'articles qui ne sont plus dans la liste.
+        checked_items &= current_keys
+
+        total = sum(len(items) for items in final_list.values())
+        checked_count = len(current_keys & checked_items)
         st.progress(
             checked_count / total if total > 0 else 0,
             text=f"✅ {checked_count}/{total} articles",
         )
 
+        new_checked = set()
+        add_checked = new_checked.add
+        checkbox = st.checkbox
         for rayon, items in final_list.items():
-            st.subheader(rayon)
-            for nom, qty, unite in items:
-                display = format_item(nom, qty, unite)
-                check_key = f"check_{rayon}_{nom}"
-                checked = st.checkbox(
-                    display,
-                    key=check_key,
-                    value=check_key in st.session_state.checked_items,
-                )
-                if checked:
-                    st.session_state.checked_items.add(check_key)
-                elif check_key in st.session_state.checked_items:
-                    st.session_state.checked_items.discard(check_key)
+            rayon_checked = sum(1 for key in check_keys[rayon] if key in checked_items)
+            with st.expander(f"{rayon} ({rayon_checked}/{len(items)})", expanded=True):
+                for (nom, qty, unite), check_key in zip(items, check_keys[rayon]):
+                    display = format_item(nom, qty, unite)
+                    if checkbox(
+                        display,
+                        key=check_key,
+                        value=check_key in checked_items,
+                    ):
+                        add_checked(check_key)
+
+        # Une seule réaffectation plutôt que deux mutations par case.
+        if new_checked != checked_items:
+            st.session_state.checked_items = new_checked
 
         st.divider()
 
         col1, col2, col3 = st.columns(3)
         with col1:
-            docx_buffer = export_to_docx(final_list, selected_recipes_final)
+            # data= callable : le document n'est construit qu'au clic,
+            # pas à chaque rerun de la page.
+            final_tuple = tuple((rayon, tuple(items)) for rayon, items in final_list.items())
             st.download_button(
                 label="📥 Exporter en Word",
-                data=docx_buffer,
+                data=lambda: export_to_docx(final_tuple, tuple(selected_recipes_final)),
                 file_name=f"Liste_courses_{datetime.now().strftime('%Y-%m-%d')}.docx",
                 mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
             )
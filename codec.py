@@ -0,0 +1,38 @@
+"""Codec JSON partagé : orjson quand il est installé, module standard sinon.
+
+Tout ce qui touche du JSON dans l'app (fichiers recettes/catalogue, corps
+des requêtes Notion) passe par `loads`/`dumps`, pour n'avoir qu'un seul
+endroit où brancher une implémentation plus rapide.
+"""
+
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+if orjson is not None:
+
+    def loads(data):
+        """Parse un document JSON (bytes ou str)."""
+        return orjson.loads(data)
+
+    def dumps(obj, indent=False):
+        """Sérialise obj en bytes JSON ; indent=True pour les fichiers sur disque."""
+        if indent:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE)
+        return orjson.dumps(obj)
+
+else:
+
+    def loads(data):
+        """Parse un document JSON (bytes ou str)."""
+        return json.loads(data)
+
+    def dumps(obj, indent=False):
+        """Sérialise obj en bytes JSON ; indent=True pour les fichiers sur disque."""
+        if indent:
+            return (json.dumps(obj, ensure_ascii=False, indent=2) + "\n").encode("utf-8")
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")